@@ -1,7 +1,8 @@
 # classifier_uploader.py
 
 import os
-import json
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 INPUT_DIR = Path("ocr_results")
@@ -26,33 +27,41 @@ def extract_text_from_textract(textract_response: dict) -> str:
     """
     Extracts all detected text from Textract JSON response.
     """
-    lines = []
-    for page in textract_response:
-        blocks = page.get("Blocks", [])
-        for block in blocks:
-            if block.get("BlockType") == "LINE":
-                lines.append(block.get("Text", ""))
+    lines = [
+        block.get("Text", "")
+        for page in textract_response
+        for block in page.get("Blocks", ())
+        if block.get("BlockType") == "LINE"
+    ]
     return "\n".join(lines)
 
+def _process_one(json_file: Path) -> None:
+    """
+    Classify a single Textract JSON file and write its result. Runs in a worker process.
+    """
+    print(f"📄 Classifying {json_file.name}")
+    textract_output = orjson.loads(json_file.read_bytes())
+
+    text = extract_text_from_textract(textract_output)
+    doc_type = mock_classify_text(text)
+
+    result = {
+        "filename": json_file.name,
+        "doc_type": doc_type,
+        "text_excerpt": text[:500]  # Optional: preview of extracted text
+    }
+
+    output_path = CLASSIFIED_DIR / f"{json_file.stem}_classified.json"
+    with open(output_path, "wb") as out_f:
+        out_f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    print(f"✅ Saved classification to {output_path}")
+
 def main():
-    for json_file in INPUT_DIR.glob("*.json"):
-        print(f"📄 Classifying {json_file.name}")
-        with open(json_file, "r") as f:
-            textract_output = json.load(f)
-
-        text = extract_text_from_textract(textract_output)
-        doc_type = mock_classify_text(text)
-
-        result = {
-            "filename": json_file.name,
-            "doc_type": doc_type,
-            "text_excerpt": text[:500]  # Optional: preview of extracted text
-        }
-
-        output_path = CLASSIFIED_DIR / f"{json_file.stem}_classified.json"
-        with open(output_path, "w") as out_f:
-            json.dump(result, out_f, indent=2)
-        print(f"✅ Saved classification to {output_path}")
+    # Inode order roughly follows on-disk layout, keeping reads sequential across thousands of small files
+    json_files = sorted(INPUT_DIR.glob("*.json"), key=lambda p: p.stat().st_ino)
+    # Files are independent, so spread them across cores; chunksize amortizes IPC for small files
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(_process_one, json_files, chunksize=8))
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,10 @@
 import os
-import tempfile
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from flask import Flask, request, jsonify
-import pandas as pd
-import joblib
-from pdf2image import convert_from_path
-import pytesseract
 import sys
 from pathlib import Path
 
@@ -12,20 +12,120 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from config import MODEL_OUTPUT_PATH
 
+# joblib/sklearn, numpy, pdf2image, PIL and the OCR helpers are imported only where
+# /predict needs them, so workers that just answer health checks stay small and start fast.
+
 app = Flask(__name__)
 
-# Load the trained document classification model on startup
+# The trained document classification model, loaded on first use. Its numpy arrays
+# are memory-mapped read-only, so every worker shares the same page-cache copy.
 doc_model = None
-try:
-    doc_model = joblib.load(MODEL_OUTPUT_PATH)
-    print(f"Document classification model '{MODEL_OUTPUT_PATH}' loaded successfully.")
-except FileNotFoundError:
+_doc_model_lock = threading.Lock()
+
+if not MODEL_OUTPUT_PATH.exists():
     print(f"WARNING: Document classification model file not found at '{MODEL_OUTPUT_PATH}'. The /predict endpoint will not work.")
 
+def get_model():
+    """Return the classification model, loading it on first call, or None if the model file is missing."""
+    global doc_model
+    if doc_model is None:
+        with _doc_model_lock:
+            if doc_model is None and MODEL_OUTPUT_PATH.exists():
+                import joblib
+                doc_model = joblib.load(MODEL_OUTPUT_PATH, mmap_mode='r')
+                print(f"Document classification model '{MODEL_OUTPUT_PATH}' loaded successfully.")
+    return doc_model
+
+def _model_status():
+    """Report whether the model is loaded, still waiting for its first use, or missing."""
+    if doc_model is not None:
+        return "loaded"
+    return "not_loaded_yet" if MODEL_OUTPUT_PATH.exists() else "not_loaded"
+
+# Pages are OCR'd in parallel. Every gunicorn worker (WEB_CONCURRENCY, exported by
+# gunicorn_conf.py) has its own pool, so each gets its share of the CPUs; more than
+# ~4 Tesseract processes stops paying off anyway
+WEB_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+OCR_MAX_WORKERS = max(1, min((os.cpu_count() or 1) // WEB_WORKERS, 4))
+
+# pdftoppm processes per upload; concurrent uploads in a worker each start their own,
+# so keep this within the worker's CPU share
+POPPLER_THREADS = min(OCR_MAX_WORKERS, 2)
+
+# Process pool shared across requests, created on first use
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def _init_ocr_worker():
+    """Pin Tesseract to one thread per pool worker."""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _ocr_page(png_bytes):
+    """OCR a single PNG-encoded page. Runs inside a pool worker."""
+    from PIL import Image
+    from ocr import image_to_text
+
+    with Image.open(BytesIO(png_bytes)) as img:
+        return image_to_text(img)
+
+def _classify_pages(model, texts):
+    """
+    Classify every page of a document in one call, so the TF-IDF transform and
+    the coefficient matmul run once over all pages instead of twice per page.
+    Returns (labels, confidences); confidences are None if the model has no predict_proba.
+    """
+    if not texts:
+        return [], []
+
+    try:
+        proba = model.predict_proba(texts)
+    except AttributeError:
+        # Model doesn't support predict_proba
+        return [str(label) for label in model.predict(texts)], [None] * len(texts)
+
+    labels = model.classes_[proba.argmax(axis=1)]
+    return [str(label) for label in labels], [float(c) for c in proba.max(axis=1)]
+
+def get_ocr_pool():
+    """Return the shared OCR process pool, creating it on first use."""
+    global _ocr_pool
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS, initializer=_init_ocr_worker)
+    return _ocr_pool
+
+# Predictions for recently seen uploads, keyed by SHA-256 of the PDF bytes
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 256))
+_prediction_cache = OrderedDict()
+_prediction_cache_lock = threading.Lock()
+
+def _cache_get(key):
+    """Return cached page predictions for key (marking them recently used), or None."""
+    with _prediction_cache_lock:
+        predictions = _prediction_cache.get(key)
+        if predictions is not None:
+            _prediction_cache.move_to_end(key)
+        return predictions
+
+def _cache_put(key, predictions):
+    """Store page predictions for key, evicting the least recently used entry when full."""
+    with _prediction_cache_lock:
+        _prediction_cache[key] = predictions
+        _prediction_cache.move_to_end(key)
+        while len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+
+def _encode_page(img):
+    """Serialize a PIL page to PNG bytes, which pickle far cheaper than Image objects."""
+    buf = BytesIO()
+    img.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
 @app.route('/')
 def health_check():
     """A simple health check endpoint."""
-    model_status = "loaded" if doc_model is not None else "not_loaded"
+    model_status = _model_status()
     return jsonify({
         "status": "ok", 
         "message": "NPLVision Document Classification API is running.",
@@ -38,7 +138,8 @@ def predict_document_type():
     """
     Accepts a PDF file upload and returns the predicted document type for each page.
     """
-    if doc_model is None:
+    model = get_model()
+    if model is None:
         return jsonify({"error": "Document classification model not loaded. Cannot perform prediction."}), 503
 
     if 'file' not in request.files:
@@ -51,38 +152,43 @@ def predict_document_type():
     if not file.filename.lower().endswith('.pdf'):
         return jsonify({"error": "Only PDF files are supported"}), 400
 
+    pdf_bytes = file.read()
+
+    # Identical uploads (retries, re-tests) skip rasterization and OCR entirely
+    cache_key = hashlib.sha256(pdf_bytes).hexdigest()
+    cached_predictions = _cache_get(cache_key)
+    if cached_predictions is not None:
+        return jsonify({
+            "success": True,
+            "filename": file.filename,
+            "page_count": len(cached_predictions),
+            "predictions": cached_predictions
+        })
+
     try:
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        from pdf2image import convert_from_bytes
+        from ocr import prepare_for_ocr
+
+        # Use pdf2image and Tesseract to extract text, just like in the training script.
+        # The upload is read once into memory; pdf2image still spools it to a temporary
+        # file for poppler and deletes it once the pages are rendered.
+        images = convert_from_bytes(pdf_bytes, dpi=200, grayscale=True, thread_count=POPPLER_THREADS)
+        pages = [_encode_page(prepare_for_ocr(img)) for img in images]
+
+        # OCR all pages in parallel across the worker pool, then classify them as one batch
+        texts = list(get_ocr_pool().map(_ocr_page, pages))
+        labels, confidences = _classify_pages(model, texts)
 
-        # Use pdf2image and pytesseract to extract text, just like in the training script
-        images = convert_from_path(temp_path)
-        
         predictions = []
-        for i, img in enumerate(images):
-            text = pytesseract.image_to_string(img)
-            # The model expects a list of documents, so we pass the text in a list
-            prediction = doc_model.predict([text])
-            
-            # Get prediction confidence/probability if available
-            try:
-                prediction_proba = doc_model.predict_proba([text])
-                confidence = float(max(prediction_proba[0]))
-            except AttributeError:
-                # Model doesn't support predict_proba
-                confidence = None
-            
+        for i, (text, label, confidence) in enumerate(zip(texts, labels, confidences)):
             predictions.append({
                 "page": i + 1,
-                "predicted_label": prediction[0],
+                "predicted_label": label,
                 "confidence": confidence,
                 "text_length": len(text)
             })
-        
-        # Clean up temporary file
-        os.unlink(temp_path)
+
+        _cache_put(cache_key, predictions)
             
         return jsonify({
             "success": True,
@@ -92,12 +198,6 @@ def predict_document_type():
         })
 
     except Exception as e:
-        # Clean up temporary file if it exists
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        
         print(f"An error occurred during document prediction: {e}")
         return jsonify({"error": "Failed to process PDF", "details": str(e)}), 500
 
@@ -105,8 +205,10 @@ def predict_document_type():
 def model_info():
     """
     Get information about the loaded document classification model.
+    Loads the model if no prediction has done so yet.
     """
-    if doc_model is None:
+    model = get_model()
+    if model is None:
         return jsonify({
             "model_loaded": False,
             "error": "Document classification model not loaded"
@@ -126,7 +228,7 @@ def model_info():
         # Get model information
         model_info_data = {
             "model_loaded": True,
-            "model_type": str(type(doc_model)),
+            "model_type": str(type(model)),
             "model_path": str(MODEL_OUTPUT_PATH)
         }
         
@@ -153,7 +255,7 @@ def api_info():
     """
     Get information about the document classification API endpoints.
     """
-    model_status = "loaded" if doc_model is not None else "not_loaded"
+    model_status = _model_status()
     
     return jsonify({
         "service_name": "NPLVision Document Classification API",
@@ -0,0 +1,21 @@
+# gunicorn_conf.py
+# Launch with: gunicorn -c gunicorn_conf.py app:app
+import os
+from multiprocessing import cpu_count
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# gevent workers yield while poppler/tesseract subprocesses run, so a single
+# worker can hold many concurrent /predict uploads instead of queueing them
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count()))
+# app.py sizes its per-worker OCR pool from this, so export the resolved count
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_connections = 100
+
+# Multi-page PDFs can take minutes to OCR
+timeout = 300
+
+# preload_app stays off so each worker imports app.py after the gevent worker has
+# patched the stdlib. The model is loaded lazily and memory-mapped, so workers
+# share one page-cache copy of its arrays without preloading.
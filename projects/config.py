@@ -7,7 +7,10 @@ BASE_DIR = Path(__file__).parent
 # Path to the folder containing training documents
 DOCS_PATH = BASE_DIR / "training_docs"
 
-# Path to the output labeled dataset CSV
+# Path to the labeled dataset, a directory of Parquet files appended to in batches
+LABELED_DATASET_DIR = BASE_DIR / "dataset_prelabeled"
+
+# Legacy CSV dataset, migrated into LABELED_DATASET_DIR on the next sync
 LABELED_DATASET_CSV = BASE_DIR / "dataset_prelabeled.csv"
 
 # Path for the trained model output
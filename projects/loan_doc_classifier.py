@@ -1,56 +1,108 @@
+import argparse
 import os
 import re
+import multiprocessing
+import time
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pdf2image import convert_from_path
-import pytesseract
-from config import DOCS_PATH, LABELED_DATASET_CSV
+from config import DOCS_PATH, LABELED_DATASET_DIR, LABELED_DATASET_CSV
+from ocr import image_to_text, prepare_for_ocr
+
+# Keywords that drive pre-labeling, each mapped to a short tag
+LABEL_KEYWORDS = [
+    ("NOTE", "note"),
+    ("PROMISE TO PAY", "ptp"),
+    ("ALLONGE", "allonge"),
+    ("ASSIGNMENT OF MORTGAGE", "aom"),
+    ("ASSIGNMENT OF DEED OF TRUST", "aodot"),
+    ("MORTGAGE", "mortgage"),
+    ("THIS MORTGAGE", "this_mtg"),
+    ("DEED OF TRUST", "dot"),
+    ("RIDER", "rider"),
+    ("BAILEE LETTER", "bailee"),
+]
+
+# Priority-ordered labeling rules. Each rule receives a tag -> present mapping,
+# whose values may be plain bools (one page) or boolean Series (a whole column).
+LABEL_RULES = [
+    # Higher priority checks first
+    ("Note", lambda has: has["note"] & has["ptp"]),
+    ("Allonge", lambda has: has["allonge"]),
+    ("Assignment", lambda has: has["aom"] | has["aodot"]),
+    ("Mortgage", lambda has: has["mortgage"] & has["this_mtg"]),
+    ("Deed of Trust", lambda has: has["dot"]),
+    # Lower priority checks last
+    ("Rider", lambda has: has["rider"]),
+    ("Bailee Letter", lambda has: has["bailee"]),
+]
+
+def _resolve_label(has) -> str:
+    """Apply LABEL_RULES in priority order to a tag -> present mapping."""
+    for label, rule in LABEL_RULES:
+        if rule(has):
+            return label
+    return "UNLABELED"
 
 def pre_label_page(text: str) -> str:
     """
     Improved pre-labeling logic with priority-based classification
-    to prevent misclassifications.
+    to prevent misclassifications. Labels a single page; dataset syncs
+    label whole columns with pre_label_pages.
     """
     text_upper = text.upper()
-    
-    # Higher priority checks first
-    if "NOTE" in text_upper and "PROMISE TO PAY" in text_upper: 
-        return "Note"
-    if "ALLONGE" in text_upper: 
-        return "Allonge"
-    if "ASSIGNMENT OF MORTGAGE" in text_upper or "ASSIGNMENT OF DEED OF TRUST" in text_upper: 
-        return "Assignment"
-    if "MORTGAGE" in text_upper and "THIS MORTGAGE" in text_upper: 
-        return "Mortgage"
-    if "DEED OF TRUST" in text_upper: 
-        return "Deed of Trust"
-    
-    # Lower priority checks last
-    if "RIDER" in text_upper: 
-        return "Rider"
-    if "BAILEE LETTER" in text_upper: 
-        return "Bailee Letter"
-    
-    return "UNLABELED"
+    return _resolve_label({tag: keyword in text_upper for keyword, tag in LABEL_KEYWORDS})
 
-def extract_borrower_name(text: str) -> str:
+def pre_label_pages(texts: pd.Series) -> pd.Series:
     """
-    Extract borrower name from document text using regex patterns.
+    Vectorized pre_label_page for a whole column of page texts. Keyword scans
+    run as C-level substring searches and priorities are resolved with np.select.
     """
-    # Common patterns for borrower names in mortgage documents
-    patterns = [
+    texts_upper = texts.astype(str).str.upper()
+    has = {tag: texts_upper.str.contains(keyword, regex=False) for keyword, tag in LABEL_KEYWORDS}
+    
+    conditions = [rule(has) for _, rule in LABEL_RULES]
+    choices = [label for label, _ in LABEL_RULES]
+    return pd.Series(np.select(conditions, choices, default="UNLABELED"), index=texts.index)
+
+# Common patterns for borrower names in mortgage documents, compiled once at import
+_BORROWER_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE | re.MULTILINE) for pattern in (
         r"(?:Borrower|Mortgagor|Maker|Obligor)[:\s]+([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,3})",
         r"(?:Name of Borrower|Borrower Name)[:\s]+([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,3})",
         r"(?:I/We|The undersigned),?\s+([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,3}),?\s+(?:promise|acknowledge|agree)",
         r"THIS (?:NOTE|MORTGAGE|DEED OF TRUST) is given by\s+([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,3})",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+    )
+]
+
+# Common patterns for property addresses in mortgage documents
+_ADDRESS_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE | re.MULTILINE) for pattern in (
+        r"(?:Property Address|Property Located at|Property Description)[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
+        r"(?:The property|Said property|Subject property) (?:is )?located at[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
+        r"(?:Street Address|Address)[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
+        r"([0-9]+\s+[A-Za-z]+\s+(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Lane|Ln|Court|Ct|Boulevard|Blvd)[^,\n]*(?:,\s*[^,\n]+){1,2})",
+    )
+]
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PAREN_RE = re.compile(r'\s*\(.*\)$')
+_TRAILING_HEREINAFTER_RE = re.compile(r'\s*hereinafter.*$', re.IGNORECASE)
+
+def extract_borrower_name(text: str) -> str:
+    """
+    Extract borrower name from document text using regex patterns.
+    """
+    for pattern in _BORROWER_PATTERNS:
+        match = pattern.search(text)
         if match:
             borrower = match.group(1).strip()
             # Clean up common OCR issues
-            borrower = re.sub(r'\s+', ' ', borrower)
+            borrower = _WHITESPACE_RE.sub(' ', borrower)
             return borrower
     
     return ""
@@ -59,45 +111,158 @@ def extract_property_address(text: str) -> str:
     """
     Extract property address from document text using regex patterns.
     """
-    # Common patterns for property addresses in mortgage documents
-    patterns = [
-        r"(?:Property Address|Property Located at|Property Description)[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
-        r"(?:The property|Said property|Subject property) (?:is )?located at[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
-        r"(?:Street Address|Address)[:\s]+([0-9]+[^,\n]+(?:,\s*[^,\n]+){1,3})",
-        r"([0-9]+\s+[A-Za-z]+\s+(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Lane|Ln|Court|Ct|Boulevard|Blvd)[^,\n]*(?:,\s*[^,\n]+){1,2})",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+    for pattern in _ADDRESS_PATTERNS:
+        match = pattern.search(text)
         if match:
             address = match.group(1).strip()
             # Clean up common OCR issues
-            address = re.sub(r'\s+', ' ', address)
+            address = _WHITESPACE_RE.sub(' ', address)
             # Remove common trailing text
-            address = re.sub(r'\s*\(.*\)$', '', address)
-            address = re.sub(r'\s*hereinafter.*$', '', address, flags=re.IGNORECASE)
+            address = _TRAILING_PAREN_RE.sub('', address)
+            address = _TRAILING_HEREINAFTER_RE.sub('', address)
             return address
     
     return ""
 
+# Poppler processes per PDF; with cpu_count() // 2 pool workers this fills every core
+POPPLER_THREADS_PER_WORKER = 2
+
+def _init_worker():
+    """Keep Tesseract single-threaded so one worker per core doesn't oversubscribe."""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _process_pdf(pdf_name: str) -> list:
+    """
+    OCR every page of one PDF in DOCS_PATH and return its dataset rows.
+    Runs inside a pool worker, so it shares no state with other files.
+    """
+    pdf_path = DOCS_PATH / pdf_name
+    print(f"Processing: {pdf_path.name}")
+    pages_data = []
+    
+    try:
+        # CRITICAL: Remove poppler_path for portability
+        images = convert_from_path(pdf_path, dpi=200, grayscale=True, thread_count=POPPLER_THREADS_PER_WORKER)
+        
+        # Extract identifiers from first page
+        extracted_borrower = ""
+        extracted_address = ""
+        
+        for i, img in enumerate(images):
+            text = image_to_text(prepare_for_ocr(img))
+            
+            # Extract borrower and address from first page only
+            if i == 0:
+                extracted_borrower = extract_borrower_name(text)
+                extracted_address = extract_property_address(text)
+            
+            pages_data.append({
+                'filename': pdf_path.name,
+                'page_number': i + 1,
+                'text': text,
+                'label': 'UNLABELED',  # Default for new pages
+                'extracted_borrower': extracted_borrower,
+                'extracted_address': extracted_address
+            })
+    except Exception as e:
+        print(f"Could not process {pdf_path.name}. Error: {e}")
+    
+    return pages_data
+
+def _dataset_schema(columns) -> pa.Schema:
+    """
+    The Parquet schema for the given dataset columns: page_number is int64 and every
+    other column a string. Fixing the types here means a column that happens to be
+    all empty (e.g. no borrower found yet) can't be inferred as double and then
+    reject the first real value appended to it.
+    """
+    return pa.schema([(c, pa.int64() if c == 'page_number' else pa.string()) for c in columns])
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerce rows to _dataset_schema: page_number to int, other columns to strings,
+    with missing extracted identifiers as '' and any other missing value as null.
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if column == 'page_number':
+            df[column] = values.astype('int64')
+            continue
+        if column in ('extracted_borrower', 'extracted_address'):
+            values = values.fillna('')
+        df[column] = values.astype(str).where(values.notna(), None)
+    return df
+
+def _write_dataset(df: pd.DataFrame, schema: pa.Schema = None, replace: bool = False):
+    """
+    Write rows to LABELED_DATASET_DIR as a new ZSTD-compressed Parquet batch.
+    With replace=True the existing files are deleted first; otherwise existing
+    data is left untouched and the rows are appended. Passing the existing
+    dataset's schema keeps appended batches type-compatible with it.
+    """
+    if schema is None:
+        schema = _dataset_schema(df.columns)
+    df = _normalize_columns(df.reindex(columns=schema.names))
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    
+    if table.num_rows == 0:
+        if replace:
+            # write_dataset writes no file for an empty table, so delete_matching would
+            # never clear the old batches; clear them here and keep an empty batch so the
+            # dataset stays readable (and a legacy CSV isn't migrated again)
+            for path in LABELED_DATASET_DIR.glob('*.parquet'):
+                path.unlink()
+            LABELED_DATASET_DIR.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, LABELED_DATASET_DIR / f"batch-{time.time_ns()}-0.parquet", compression='zstd')
+        return
+    ds.write_dataset(
+        table,
+        LABELED_DATASET_DIR,
+        format='parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        basename_template=f"batch-{time.time_ns()}-{{i}}.parquet",
+        existing_data_behavior='delete_matching' if replace else 'overwrite_or_ignore'
+    )
+
 def update_and_label_dataset():
     """
     Intelligently updates a dataset with new PDFs and removes data for deleted PDFs,
     preserving all existing manual labels. Now also extracts borrower names and property addresses.
+    New pages are appended as a new Parquet batch; existing data is only rewritten
+    when rows have to be removed or the columns change.
     """
     print("--- Smart Dataset Sync ---")
     
     pdf_files_in_folder = {p.name for p in DOCS_PATH.glob('*.pdf')}
+    schema = None
+    needs_rewrite = False
     
-    if LABELED_DATASET_CSV.exists():
-        print(f"Loading existing labeled data from '{LABELED_DATASET_CSV}'...")
-        df = pd.read_csv(LABELED_DATASET_CSV)
+    if LABELED_DATASET_DIR.exists() or LABELED_DATASET_CSV.exists():
+        if LABELED_DATASET_DIR.exists():
+            if LABELED_DATASET_CSV.exists():
+                print(f"Warning: '{LABELED_DATASET_CSV}' is ignored because '{LABELED_DATASET_DIR}' exists. "
+                      f"Run with --import-labels {LABELED_DATASET_CSV} to keep labels edited there, then delete it.")
+            print(f"Loading existing labeled data from '{LABELED_DATASET_DIR}'...")
+            dataset = ds.dataset(LABELED_DATASET_DIR, format='parquet')
+            schema = dataset.schema.remove_metadata()
+            df = dataset.to_table().to_pandas()
+            # Datasets written before the schema was fixed may have mistyped columns
+            if not schema.equals(_dataset_schema(schema.names)):
+                schema = None
+                needs_rewrite = True
+        else:
+            print(f"Migrating existing labeled data from '{LABELED_DATASET_CSV}'...")
+            df = pd.read_csv(LABELED_DATASET_CSV)
+            needs_rewrite = True
         
         # Ensure new columns exist in existing dataset
         if 'extracted_borrower' not in df.columns:
             df['extracted_borrower'] = ''
+            needs_rewrite = True
         if 'extracted_address' not in df.columns:
             df['extracted_address'] = ''
+            needs_rewrite = True
         
         # Remove data for deleted PDFs
         initial_rows = len(df)
@@ -105,6 +270,7 @@ def update_and_label_dataset():
         removed_rows = initial_rows - len(df)
         if removed_rows > 0:
             print(f"Removed {removed_rows} rows corresponding to deleted PDFs.")
+            needs_rewrite = True
 
         processed_files = set(df['filename'].unique())
     else:
@@ -112,57 +278,31 @@ def update_and_label_dataset():
         processed_files = set()
 
     new_files_to_process = pdf_files_in_folder - processed_files
+    df_new = None
     
     if not new_files_to_process:
         print("No new documents to add.")
     else:
         print(f"Found {len(new_files_to_process)} new document(s) to process.")
-        new_pages_data = []
-        
-        for pdf_name in new_files_to_process:
-            pdf_path = DOCS_PATH / pdf_name
-            print(f"Processing: {pdf_path.name}")
-            
-            try:
-                # CRITICAL: Remove poppler_path for portability
-                images = convert_from_path(pdf_path)
-                
-                # Extract identifiers from first page
-                first_page_text = ""
-                extracted_borrower = ""
-                extracted_address = ""
-                
-                for i, img in enumerate(images):
-                    text = pytesseract.image_to_string(img)
-                    
-                    # Extract borrower and address from first page only
-                    if i == 0:
-                        first_page_text = text
-                        extracted_borrower = extract_borrower_name(text)
-                        extracted_address = extract_property_address(text)
-                    
-                    new_pages_data.append({
-                        'filename': pdf_path.name,
-                        'page_number': i + 1,
-                        'text': text,
-                        'label': 'UNLABELED',  # Default for new pages
-                        'extracted_borrower': extracted_borrower,
-                        'extracted_address': extracted_address
-                    })
-            except Exception as e:
-                print(f"Could not process {pdf_path.name}. Error: {e}")
+        processes = max(1, (os.cpu_count() or 1) // 2)
+        with multiprocessing.Pool(processes=processes, initializer=_init_worker) as pool:
+            results = pool.map(_process_pdf, sorted(new_files_to_process))
+        new_pages_data = [row for rows in results for row in rows]
         
         if new_pages_data:
             df_new = pd.DataFrame(new_pages_data)
             # Apply pre-labeling to new data
-            df_new['label'] = df_new['text'].astype(str).apply(pre_label_page)
+            df_new['label'] = pre_label_pages(df_new['text'])
             df = pd.concat([df, df_new], ignore_index=True)
 
-    # Save updated dataset
-    df.to_csv(LABELED_DATASET_CSV, index=False)
+    # Save updated dataset: rewrite everything only when existing rows changed
+    if needs_rewrite:
+        _write_dataset(df, replace=True)
+    elif df_new is not None:
+        _write_dataset(df_new, schema=schema)
     
     print(f"\nProcessing complete.")
-    print(f"Dataset synced and saved to '{LABELED_DATASET_CSV}'.")
+    print(f"Dataset synced and saved to '{LABELED_DATASET_DIR}'.")
     print(f"Total pages in dataset: {len(df)}")
     
     # Show sample of extracted identifiers
@@ -174,5 +314,80 @@ def update_and_label_dataset():
             print(f"    Borrower: {row['extracted_borrower'] or 'Not found'}")
             print(f"    Address: {row['extracted_address'] or 'Not found'}")
 
+# Columns an imported CSV may set; train_model prefers ground_truth_label over label
+LABEL_COLUMNS = ['label', 'ground_truth_label']
+
+def export_labels_csv(csv_path: Path):
+    """
+    Write the whole dataset to a CSV for manual labeling, e.g. filling in a
+    ground_truth_label column in a spreadsheet; read it back with import_labels.
+    """
+    if not LABELED_DATASET_DIR.exists():
+        print(f"Error: '{LABELED_DATASET_DIR}' not found. Run this script without options first.")
+        return
+    df = ds.dataset(LABELED_DATASET_DIR, format='parquet').to_table().to_pandas()
+    if 'ground_truth_label' not in df.columns:
+        df['ground_truth_label'] = ''
+    df.to_csv(csv_path, index=False)
+    print(f"Exported {len(df)} pages to '{csv_path}'.")
+
+def import_labels(csv_path: Path):
+    """
+    Copy the label and ground_truth_label columns of a CSV (an export, or the
+    legacy dataset_prelabeled.csv) into the dataset, matching rows on filename
+    and page_number. Other columns and rows not in the dataset are ignored.
+    """
+    if not LABELED_DATASET_DIR.exists():
+        print(f"Error: '{LABELED_DATASET_DIR}' not found. Run this script without options first.")
+        return
+    edited = pd.read_csv(csv_path, dtype={'label': str, 'ground_truth_label': str})
+    label_columns = [c for c in LABEL_COLUMNS if c in edited.columns]
+    if not {'filename', 'page_number'} <= set(edited.columns) or not label_columns:
+        print(f"Error: '{csv_path}' needs filename, page_number and a label or ground_truth_label column.")
+        return
+    
+    keys = ['filename', 'page_number']
+    edited = edited.dropna(subset=keys).astype({'page_number': 'int64'})
+    edited = edited.drop_duplicates(subset=keys, keep='last').set_index(keys)[label_columns]
+    edited = edited.apply(lambda col: col.str.strip()).replace('', np.nan)
+    
+    df = ds.dataset(LABELED_DATASET_DIR, format='parquet').to_table().to_pandas().set_index(keys)
+    for column in label_columns:
+        if column not in df.columns:
+            df[column] = None
+    # update() matches rows on filename/page_number and skips blank cells, so a
+    # label left empty in the CSV keeps the dataset's value
+    df.update(edited)
+    matched = int(edited.index.isin(df.index).sum())
+    
+    _write_dataset(df.reset_index(), replace=True)
+    print(f"Imported {', '.join(label_columns)} for {matched} of {len(edited)} rows in '{csv_path}'.")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Sync the labeled page dataset with the PDFs in the docs folder'
+    )
+    parser.add_argument(
+        '--export-csv',
+        type=Path,
+        metavar='PATH',
+        help='Export the dataset to a CSV for manual labeling instead of syncing'
+    )
+    parser.add_argument(
+        '--import-labels',
+        type=Path,
+        metavar='PATH',
+        help='Import label and ground_truth_label edits from a CSV instead of syncing'
+    )
+    
+    args = parser.parse_args()
+    
+    if args.export_csv:
+        export_labels_csv(args.export_csv)
+    elif args.import_labels:
+        import_labels(args.import_labels)
+    else:
+        update_and_label_dataset()
+
 if __name__ == '__main__':
-    update_and_label_dataset()
\ No newline at end of file
+    main()
\ No newline at end of file
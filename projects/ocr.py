@@ -0,0 +1,81 @@
+# ocr.py
+"""
+Shared page OCR for the training script and the classification API.
+
+When tesserocr is installed a single PyTessBaseAPI handle is kept per process,
+so the Tesseract binary and language data are loaded once rather than once per
+page. Without it, pages go through pytesseract as before.
+"""
+import threading
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+    import pytesseract
+
+# Pages wider than this are downscaled before OCR (matches ocr_repair_helper.py)
+MAX_OCR_WIDTH = 1500
+
+# Created lazily so each process (including pool workers) gets its own handle
+_tess_api = None
+# The API handle is not thread-safe
+_tess_lock = threading.Lock()
+
+def _get_tess_api():
+    global _tess_api
+    if _tess_api is None:
+        _tess_api = tesserocr.PyTessBaseAPI(lang='eng', psm=tesserocr.PSM.AUTO, oem=tesserocr.OEM.DEFAULT)
+    return _tess_api
+
+def image_to_text(img) -> str:
+    """
+    Run OCR on a PIL image and return the recognized text.
+    """
+    if tesserocr is None:
+        return pytesseract.image_to_string(img)
+
+    with _tess_lock:
+        api = _get_tess_api()
+        api.SetImage(img)
+        return api.GetUTF8Text()
+
+def _otsu_threshold(histogram) -> int:
+    """Return the grey level that maximizes between-class variance for a 256-bin histogram."""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    weight_bg = 0
+    sum_bg = 0
+    best_threshold, best_variance = 0, 0.0
+
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += level * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+
+    return best_threshold
+
+def prepare_for_ocr(img):
+    """
+    Shrink and binarize a page image before OCR. Tesseract's runtime scales
+    with pixel count, and clean black-on-white input is its fastest path.
+    """
+    grayscale = img.convert("L")
+
+    if grayscale.width > MAX_OCR_WIDTH:
+        ratio = MAX_OCR_WIDTH / grayscale.width
+        new_height = int(grayscale.height * ratio)
+        grayscale = grayscale.resize((MAX_OCR_WIDTH, new_height), Image.LANCZOS)
+
+    threshold = _otsu_threshold(grayscale.histogram())
+    return grayscale.point([0 if level <= threshold else 255 for level in range(256)])
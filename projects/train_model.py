@@ -1,12 +1,51 @@
 import argparse
-import pandas as pd
+import numpy as np
+import pyarrow.dataset as ds
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import make_pipeline
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
-from config import LABELED_DATASET_CSV, MODEL_OUTPUT_PATH
+from config import LABELED_DATASET_DIR, MODEL_OUTPUT_PATH
+
+def clean_labeled_pages(df, label_column):
+    """
+    Drop pages with no text or label, normalize labels and filter out UNLABELED samples.
+    """
+    df = df.dropna(subset=['text', label_column])
+    df = df.assign(**{label_column: df[label_column].astype(str).str.strip()})
+    return df[df[label_column] != 'UNLABELED']
+
+def save_model_if_accurate(model_pipeline, accuracy, min_accuracy, report_labels,
+                           training_samples, test_samples):
+    """
+    Save the model and its metadata if accuracy meets min_accuracy.
+    """
+    if accuracy >= min_accuracy:
+        joblib.dump(model_pipeline, MODEL_OUTPUT_PATH)
+        print(f"\nModel performance meets the {min_accuracy:.2%} threshold.")
+        print(f"Model saved to '{MODEL_OUTPUT_PATH}'")
+        
+        # Also save model metadata
+        metadata = {
+            'accuracy': accuracy,
+            'training_samples': training_samples,
+            'test_samples': test_samples,
+            'labels': report_labels,
+            'min_accuracy_threshold': min_accuracy
+        }
+        metadata_path = MODEL_OUTPUT_PATH.parent / f"{MODEL_OUTPUT_PATH.stem}_metadata.json"
+        import json
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        print(f"Model metadata saved to '{metadata_path}'")
+    else:
+        print(f"\nModel performance ({accuracy:.2%}) is below the {min_accuracy:.2%} threshold.")
+        print("Model not saved. Consider:")
+        print("  - Adding more training data")
+        print("  - Improving text extraction quality")
+        print("  - Adjusting the minimum accuracy threshold")
 
 def train_and_evaluate_model(min_accuracy=0.80):
     """
@@ -20,21 +59,18 @@ def train_and_evaluate_model(min_accuracy=0.80):
     print(f"Minimum accuracy threshold: {min_accuracy:.2%}")
     
     # Load dataset
-    try:
-        df = pd.read_csv(LABELED_DATASET_CSV)
-    except FileNotFoundError:
-        print(f"Error: '{LABELED_DATASET_CSV}' not found. Please ensure you have created and labeled the dataset first.")
+    if not LABELED_DATASET_DIR.exists():
+        print(f"Error: '{LABELED_DATASET_DIR}' not found. Please ensure you have created and labeled the dataset first.")
         return
+    dataset = ds.dataset(LABELED_DATASET_DIR, format='parquet')
 
     # Use 'label' column if 'ground_truth_label' doesn't exist (for newly generated datasets)
-    label_column = 'ground_truth_label' if 'ground_truth_label' in df.columns else 'label'
+    label_column = 'ground_truth_label' if 'ground_truth_label' in dataset.schema.names else 'label'
     
-    # Clean data
-    df.dropna(subset=['text', label_column], inplace=True)
-    df[label_column] = df[label_column].astype(str).str.strip()
+    # Only the text and label columns are needed, so skip reading the rest
+    df = dataset.to_table(columns=['text', label_column]).to_pandas()
     
-    # Filter out UNLABELED samples
-    df = df[df[label_column] != 'UNLABELED']
+    df = clean_labeled_pages(df, label_column)
     
     print(f"Loaded {len(df)} labeled pages.")
     
@@ -59,17 +95,21 @@ def train_and_evaluate_model(min_accuracy=0.80):
     print(f"\nData split into {len(X_train)} training samples and {len(X_test)} testing samples.")
 
     # Define and train model pipeline
-    # Using TfidfVectorizer with n-grams and LinearSVC for better performance
+    # Using TfidfVectorizer with n-grams (float32 halves the feature matrix) and a
+    # SAGA logistic regression, which converges quickly on sparse text and gives predict_proba
     model_pipeline = make_pipeline(
         TfidfVectorizer(
             stop_words='english', 
             ngram_range=(1, 3),
             max_features=5000,
-            min_df=2
+            min_df=2,
+            sublinear_tf=True,
+            dtype=np.float32
         ),
-        LinearSVC(
+        LogisticRegression(
+            solver='saga',
             random_state=42,
-            max_iter=2000,
+            max_iter=200,
             C=1.0
         )
     )
@@ -89,31 +129,108 @@ def train_and_evaluate_model(min_accuracy=0.80):
     report_labels = sorted(list(y_train.unique()))
     print(classification_report(y_test, y_pred, labels=report_labels, zero_division=0))
 
-    # Save the model if it meets the threshold
-    if accuracy >= min_accuracy:
-        joblib.dump(model_pipeline, MODEL_OUTPUT_PATH)
-        print(f"\nModel performance meets the {min_accuracy:.2%} threshold.")
-        print(f"Model saved to '{MODEL_OUTPUT_PATH}'")
-        
-        # Also save model metadata
-        metadata = {
-            'accuracy': accuracy,
-            'training_samples': len(X_train),
-            'test_samples': len(X_test),
-            'labels': report_labels,
-            'min_accuracy_threshold': min_accuracy
-        }
-        metadata_path = MODEL_OUTPUT_PATH.parent / f"{MODEL_OUTPUT_PATH.stem}_metadata.json"
-        import json
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        print(f"Model metadata saved to '{metadata_path}'")
-    else:
-        print(f"\nModel performance ({accuracy:.2%}) is below the {min_accuracy:.2%} threshold.")
-        print("Model not saved. Consider:")
-        print("  - Adding more training data")
-        print("  - Improving text extraction quality")
-        print("  - Adjusting the minimum accuracy threshold")
+    save_model_if_accurate(
+        model_pipeline, accuracy, min_accuracy, report_labels,
+        training_samples=len(X_train), test_samples=len(X_test)
+    )
+
+def train_out_of_core(min_accuracy=0.80, batch_size=2048, test_size=0.2, epochs=5):
+    """
+    Streams the labeled dataset in record batches through a HashingVectorizer and
+    an SGDClassifier trained with partial_fit, so memory stays bounded by batch_size
+    however large the corpus grows. Rows are assigned to the held-out test set by a
+    seeded draw per batch, which every training epoch and the evaluation pass repeat
+    exactly. Training rows are shuffled within each batch, from a separately seeded
+    generator, so SGD doesn't see pages in dataset order.
+    
+    Args:
+        min_accuracy: Minimum accuracy threshold for saving the model (default: 0.80)
+        batch_size: Rows per record batch read from the dataset
+        test_size: Fraction of rows held out for evaluation
+        epochs: Passes over the training rows
+    """
+    print("--- Starting Out-of-Core Model Training and Evaluation ---")
+    print(f"Minimum accuracy threshold: {min_accuracy:.2%}")
+    
+    if not LABELED_DATASET_DIR.exists():
+        print(f"Error: '{LABELED_DATASET_DIR}' not found. Please ensure you have created and labeled the dataset first.")
+        return
+    dataset = ds.dataset(LABELED_DATASET_DIR, format='parquet')
+    label_column = 'ground_truth_label' if 'ground_truth_label' in dataset.schema.names else 'label'
+    
+    # Label counts only need the label column
+    labels = dataset.to_table(columns=[label_column]).column(label_column).to_pandas()
+    labels = labels.dropna().astype(str).str.strip()
+    label_counts = labels[labels != 'UNLABELED'].value_counts()
+    print(f"Loaded {label_counts.sum()} labeled pages.")
+    print("\nLabel distribution:")
+    for label, count in label_counts.items():
+        print(f"  {label}: {count} samples")
+    
+    # Remove rare classes (less than 2 samples)
+    all_labels = sorted(label_counts[label_counts >= 2].index)
+    if not all_labels:
+        print("Error: no label has at least 2 samples.")
+        return
+    
+    def iter_batches():
+        """Yield (texts, labels, is_test) per record batch, with the same split every pass."""
+        rng = np.random.default_rng(42)
+        for batch in dataset.to_batches(columns=['text', label_column], batch_size=batch_size):
+            df = clean_labeled_pages(batch.to_pandas(), label_column)
+            df = df[df[label_column].isin(all_labels)]
+            yield df['text'], df[label_column], rng.random(len(df)) < test_size
+    
+    vectorizer = HashingVectorizer(
+        n_features=2**19,
+        ngram_range=(1, 3),
+        alternate_sign=False,
+        dtype=np.float32
+    )
+    classifier = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42, n_jobs=-1)
+    
+    print("\nTraining the model batch by batch...")
+    shuffle_rng = np.random.default_rng(43)
+    training_samples = 0
+    for epoch in range(epochs):
+        epoch_samples = 0
+        for texts, y, is_test in iter_batches():
+            train_texts, train_y = texts[~is_test], y[~is_test]
+            if len(train_y):
+                order = shuffle_rng.permutation(len(train_y))
+                classifier.partial_fit(
+                    vectorizer.transform(train_texts.iloc[order]), train_y.iloc[order], classes=all_labels
+                )
+                epoch_samples += len(train_y)
+        training_samples = epoch_samples
+        print(f"  Epoch {epoch + 1}/{epochs} done")
+    if training_samples == 0:
+        print("Error: no training samples after the held-out split.")
+        return
+    print(f"Training complete on {training_samples} samples.")
+    
+    print("\nEvaluating model performance on the held-out pages...")
+    y_test, y_pred = [], []
+    for texts, y, is_test in iter_batches():
+        if is_test.any():
+            y_test.extend(y[is_test])
+            y_pred.extend(classifier.predict(vectorizer.transform(texts[is_test])))
+    if not y_test:
+        print("Error: no held-out samples to evaluate on.")
+        return
+    
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"\nModel Accuracy: {accuracy:.2%}")
+    
+    print("\nClassification Report:")
+    print(classification_report(y_test, y_pred, labels=all_labels, zero_division=0))
+    
+    # HashingVectorizer is stateless, so the pipeline is ready for predict as-is
+    model_pipeline = make_pipeline(vectorizer, classifier)
+    save_model_if_accurate(
+        model_pipeline, accuracy, min_accuracy, all_labels,
+        training_samples=training_samples, test_samples=len(y_test)
+    )
 
 def main():
     parser = argparse.ArgumentParser(
@@ -125,6 +242,11 @@ def main():
         default=0.85,
         help='Minimum accuracy threshold for saving the model (default: 0.85)'
     )
+    parser.add_argument(
+        '--out-of-core',
+        action='store_true',
+        help='Stream the dataset in batches (HashingVectorizer + SGDClassifier) instead of loading it into memory'
+    )
     
     args = parser.parse_args()
     
@@ -133,7 +255,10 @@ def main():
         print(f"Error: min-accuracy must be between 0 and 1, got {args.min_accuracy}")
         return
     
-    train_and_evaluate_model(min_accuracy=args.min_accuracy)
+    if args.out_of_core:
+        train_out_of_core(min_accuracy=args.min_accuracy)
+    else:
+        train_and_evaluate_model(min_accuracy=args.min_accuracy)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -7,13 +7,17 @@ Usage: python3 ocr_repair_helper.py <input_pdf> <output_pdf>
 
 import sys
 import os
+import io
 from pathlib import Path
 from pdf2image import convert_from_path
 from PIL import Image
 import img2pdf
-import tempfile
 import gc
 
+# Each poppler thread is a separate pdftoppm process holding its own page buffers,
+# so keep this small on memory-constrained hosts
+POPPLER_THREADS = min(os.cpu_count() or 1, 2)
+
 def enhance_pdf(input_path: str, output_path: str) -> bool:
     """
     Enhance a PDF for better OCR results
@@ -28,40 +32,37 @@ def enhance_pdf(input_path: str, output_path: str) -> bool:
     try:
         print(f"[OCR Enhancement] Processing: {Path(input_path).name}")
         
-        # Create temporary directory for images
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Convert PDF to grayscale images at lower DPI to reduce memory usage
-            images = convert_from_path(input_path, dpi=150)  # Reduced from 300 to 150
-            image_paths = []
-            
-            for idx, img in enumerate(images):
-                # Convert to grayscale and reduce size for memory efficiency
-                grayscale = img.convert("L")
-                
-                # Resize if image is very large (width > 1500 pixels)
-                if grayscale.width > 1500:
-                    ratio = 1500 / grayscale.width
-                    new_height = int(grayscale.height * ratio)
-                    grayscale = grayscale.resize((1500, new_height), Image.Resampling.LANCZOS)
-                
-                # Save temporary image
-                temp_image_path = Path(temp_dir) / f"page_{idx + 1}.png"
-                grayscale.save(temp_image_path, optimize=True)
-                image_paths.append(str(temp_image_path))
-                
-                # Clear from memory immediately
-                grayscale.close()
-                img.close()
-            
-            # Reassemble optimized PDF
-            with open(output_path, "wb") as f:
-                f.write(img2pdf.convert(image_paths))
+        # Convert PDF to grayscale images at lower DPI to reduce memory usage
+        images = convert_from_path(input_path, dpi=150, grayscale=True, thread_count=POPPLER_THREADS)  # Reduced from 300 to 150
+        page_images = []
+        
+        for img in images:
+            # Resize if image is very large (width > 1500 pixels) for memory efficiency
+            page = img
+            if page.width > 1500:
+                ratio = 1500 / page.width
+                new_height = int(page.height * ratio)
+                page = page.resize((1500, new_height), Image.Resampling.LANCZOS)
             
-            # Force garbage collection to free memory
-            gc.collect()
+            # Encode in memory with fast compression; img2pdf embeds the PNG data as-is
+            buf = io.BytesIO()
+            page.save(buf, format="PNG", compress_level=1)
+            page_images.append(buf.getvalue())
             
-            print(f"[OCR Enhancement] Successfully created: {Path(output_path).name}")
-            return True
+            # Clear from memory immediately
+            page.close()
+            img.close()
+        
+        # Reassemble optimized PDF
+        with open(output_path, "wb") as f:
+            f.write(img2pdf.convert(page_images))
+        
+        # Force garbage collection to free memory
+        del page_images
+        gc.collect()
+        
+        print(f"[OCR Enhancement] Successfully created: {Path(output_path).name}")
+        return True
             
     except Exception as e:
         print(f"[OCR Enhancement] Error: {str(e)}")
@@ -1,18 +1,26 @@
+import functools
+import hashlib
+import mmap
 import os
+import random
 import time
 import boto3
-import json
+from boto3.s3.transfer import TransferConfig
+import orjson
 import shutil
+import tempfile
+from io import BytesIO
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from dotenv import load_dotenv
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 import img2pdf
 from datetime import datetime
 
-print("Running unified textract_processor.py with integrated OCR repair...")
-
 # ✅ Load environment variables from .env
 load_dotenv()
 
@@ -22,122 +30,431 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 S3_BUCKET = os.getenv("S3_BUCKET", "nplvision-textract-inputs")  # Default if not in .env
 
-# ✅ Initialize AWS clients using env credentials
-s3 = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+# ✅ AWS clients share one session and a pooled, keep-alive config sized for the
+# worker threads; adaptive retries back off on throttling
+_CLIENT_CFG = Config(
+    max_pool_connections=32,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True,
 )
 
-textract = boto3.client(
-    "textract",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+@functools.cache
+def _session():
+    return boto3.session.Session(
+        region_name=AWS_REGION,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    )
+
+# Clients are built on first use, so importing this module for its helpers stays cheap
+@functools.cache
+def _s3():
+    return _session().client("s3", config=_CLIENT_CFG)
+
+@functools.cache
+def _textract():
+    return _session().client("textract", config=_CLIENT_CFG)
+
+# Multipart uploads in ~50MB parts, 10 at a time, for anything over 64MB
+_TRANSFER_CFG = TransferConfig(
+    multipart_threshold=64 * 1024**2,
+    multipart_chunksize=50 * 1024**2,
+    max_concurrency=10,
+    use_threads=True,
 )
 
 # ✅ Input/output directories
 INPUT_DIR = Path("docs/test_set")  # Now processing original PDFs directly
-TEMP_IMAGE_DIR = Path("temp_images")
-OPTIMIZED_PDF_DIR = Path("ocr_optimized_pdfs")
 OUTPUT_DIR = Path("ocr_results")
 LOG_FILE = Path("ocr_pipeline_log.json")
 
-# Create necessary directories
-TEMP_IMAGE_DIR.mkdir(exist_ok=True)
-OPTIMIZED_PDF_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Textract results keyed by input PDF content, so unchanged PDFs are never re-OCR'd.
+# Bump PIPELINE_VERSION whenever repair or Textract settings change to invalidate it.
+CACHE_DIR = Path("ocr_cache")
+PIPELINE_VERSION = "2"
+
+# Rasterization is CPU-bound, so repairs run one process per core; uploads,
+# Textract submissions and result fetches are network-bound and run on threads
+REPAIR_WORKERS = os.cpu_count() or 1
+MAX_WORKERS = 16
+
+# Repaired PDFs travel to the upload threads as in-memory bytes, so cap how many
+# PDFs can be repairing, waiting for an upload thread or uploading at once
+MAX_PDFS_IN_FLIGHT = 2 * REPAIR_WORKERS
 
-def repair_and_optimize_pdf(pdf_path: Path, temp_dir: Path, output_dir: Path) -> Path:
+# Poppler threads per rasterization; repair pool workers drop this to 1
+_poppler_threads = os.cpu_count() or 1
+
+# Gap between status polls of different jobs, so a polling round never exceeds
+# 5 GetDocumentTextDetection calls per second however many jobs are open
+POLL_INTERVAL = 0.2
+
+# PDFs averaging more than this per page are rasterized even if otherwise well-formed
+MAX_BYTES_PER_PAGE = 20 * 1024**2
+
+def _pdf_info(pdf_path: Path) -> dict:
+    """Return poppler's pdfinfo fields for a PDF, or an empty dict if it can't be parsed."""
+    try:
+        return pdfinfo_from_path(str(pdf_path))
+    except Exception:
+        return {}
+
+def _needs_repair(pdf_path: Path, info: dict) -> bool:
+    """
+    Decide whether a PDF must be rasterized before Textract will take it.
+    PDFs that pdfinfo can't parse, that are encrypted, have no pages, or are
+    unusually heavy per page get repaired; everything else is uploaded as-is.
+    """
+    pages = info.get("Pages", 0)
+    if pages == 0 or not str(info.get("Encrypted", "no")).startswith("no"):
+        return True
+    return pdf_path.stat().st_size / pages > MAX_BYTES_PER_PAGE
+
+def _init_repair_worker():
+    """Render with a single poppler thread, since the repair pool already fills every core."""
+    global _poppler_threads
+    _poppler_threads = 1
+
+def repair_and_optimize_pdf(pdf_path: Path, info: dict = None, force: bool = False):
     """
     Optimizes a PDF for OCR by converting to grayscale images and reassembling.
+    Pages are JPEG-encoded in memory and embedded by img2pdf as-is, and the
+    optimized PDF is returned as bytes to be uploaded straight from memory.
     
     Args:
         pdf_path: Path to the input PDF
-        temp_dir: Directory for temporary image files
-        output_dir: Directory for the optimized PDF output
+        info: pdfinfo fields for pdf_path, if the caller already has them
+        force: Repair even if pdf_path looks well-formed
         
     Returns:
-        Path to the optimized PDF file
+        The optimized PDF bytes, or None if pdf_path needs no repair
     """
-    print(f"🔧 Optimizing PDF: {pdf_path.name}")
+    if info is None:
+        info = _pdf_info(pdf_path)
     
-    # Create subdirectory for this PDF's temporary images
-    pdf_temp_dir = temp_dir / pdf_path.stem
-    pdf_temp_dir.mkdir(exist_ok=True)
+    if not force and not _needs_repair(pdf_path, info):
+        print(f"⏩ {pdf_path.name} is already well-formed, skipping repair")
+        return None
+    
+    print(f"🔧 Optimizing PDF: {pdf_path.name}")
     
     try:
-        # Convert PDF to grayscale images at 300 DPI
-        images = convert_from_path(str(pdf_path), dpi=300)
-        image_paths = []
+        # Convert PDF to grayscale images at 200 DPI, where Textract's accuracy has
+        # already levelled off; pages are rendered on up to one poppler thread each
+        n_pages = info.get("Pages", 0)
+        images = convert_from_path(
+            str(pdf_path),
+            dpi=200,
+            thread_count=min(_poppler_threads, n_pages) if n_pages else _poppler_threads,
+            grayscale=True,
+        )
         
-        for idx, img in enumerate(images):
-            # Convert to grayscale
-            grayscale = img.convert("L")
-            
-            # Save temporary image
-            temp_image_path = pdf_temp_dir / f"page_{idx + 1}.png"
-            grayscale.save(temp_image_path)
-            image_paths.append(temp_image_path)
+        jpeg_pages = []
+        for img in images:
+            buf = BytesIO()
+            img.save(buf, format="JPEG", quality=85, optimize=True)
+            jpeg_pages.append(buf.getvalue())
         
         # Reassemble optimized PDF
-        output_pdf_path = output_dir / f"{pdf_path.stem}_ocr_fixed.pdf"
-        with open(output_pdf_path, "wb") as f:
-            f.write(img2pdf.convert([str(p) for p in image_paths]))
-        
-        print(f"✅ Created optimized PDF: {output_pdf_path.name}")
+        optimized_pdf = img2pdf.convert(jpeg_pages)
         
-        # Clean up temporary images
-        for path in image_paths:
-            path.unlink()
-        pdf_temp_dir.rmdir()  # Remove the subdirectory
+        print(f"✅ Created optimized PDF for {pdf_path.name} ({len(optimized_pdf) / 1024**2:.1f} MB)")
         
-        return output_pdf_path
+        return optimized_pdf
         
     except Exception as e:
-        # Clean up on error
-        if pdf_temp_dir.exists():
-            shutil.rmtree(pdf_temp_dir)
         raise Exception(f"Failed to optimize PDF: {str(e)}")
 
-def upload_to_s3(file_path, s3_key):
-    s3.upload_file(str(file_path), S3_BUCKET, s3_key)
-    print(f"☁️ Uploaded {file_path.name} to s3://{S3_BUCKET}/{s3_key}")
+def _file_sha256(path: Path, prefix: bytes = b"") -> str:
+    """
+    SHA-256 of `prefix` followed by the file's contents. The file is memory-mapped
+    rather than read, so hashing never copies a large PDF into Python memory.
+    """
+    h = hashlib.sha256(prefix)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+    return h.hexdigest()
+
+def _s3_object_sha256(s3_key):
+    """
+    Return the sha256 metadata of an uploaded object, or None if it doesn't exist
+    or can't be checked. S3 answers 403 rather than 404 for a missing key when the
+    caller lacks s3:ListBucket, and this check is only an optimization, so any
+    failure just means the file gets uploaded.
+    """
+    try:
+        response = _s3().head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except (BotoCoreError, ClientError):
+        return None
+    return response.get("Metadata", {}).get("sha256")
+
+def upload_to_s3(source, s3_key):
+    """
+    Upload a PDF, given as a file path or as in-memory bytes, to s3_key.
+    """
+    # The content hash travels as object metadata, because multipart ETags aren't plain MD5s
+    in_memory = isinstance(source, bytes)
+    sha256 = hashlib.sha256(source).hexdigest() if in_memory else _file_sha256(source)
+    if _s3_object_sha256(s3_key) == sha256:
+        print(f"⏩ s3://{S3_BUCKET}/{s3_key} is already up to date, skipping upload")
+        return
+    
+    extra_args = {"Metadata": {"sha256": sha256}}
+    if in_memory:
+        _s3().upload_fileobj(BytesIO(source), S3_BUCKET, s3_key, ExtraArgs=extra_args, Config=_TRANSFER_CFG)
+    else:
+        _s3().upload_file(str(source), S3_BUCKET, s3_key, ExtraArgs=extra_args, Config=_TRANSFER_CFG)
+    print(f"☁️ Uploaded to s3://{S3_BUCKET}/{s3_key}")
 
 def start_textract_job(s3_key):
-    response = textract.start_document_text_detection(
+    response = _textract().start_document_text_detection(
         DocumentLocation={"S3Object": {"Bucket": S3_BUCKET, "Name": s3_key}}
     )
     return response["JobId"]
 
 def is_job_complete(job_id):
-    response = textract.get_document_text_detection(JobId=job_id)
+    response = _textract().get_document_text_detection(JobId=job_id)
     return response["JobStatus"], response
 
-def get_job_results(job_id):
-    pages = []
-    next_token = None
+def _wait_for_jobs(job_ids, initial=1.0, cap=15.0):
+    """
+    Poll Textract jobs round-robin, yielding (job_id, status, error) as each one finishes.
+    Polls within a round are spaced POLL_INTERVAL apart to stay under the Get* TPS
+    quota; between rounds the delay doubles from `initial` up to `cap`, with ±20% jitter.
+    A poll that raises finishes that job as FAILED instead of stopping the others.
+    """
+    outstanding = list(job_ids)
+    delay = initial
+    while outstanding:
+        still_running = []
+        for i, job_id in enumerate(outstanding):
+            if i:
+                time.sleep(POLL_INTERVAL)
+            try:
+                status, response = is_job_complete(job_id)
+            except Exception as e:
+                yield job_id, "FAILED", str(e)
+                continue
+            if status == "IN_PROGRESS":
+                still_running.append(job_id)
+            else:
+                yield job_id, status, response.get("StatusMessage")
+        outstanding = still_running
+        if outstanding:
+            time.sleep(delay * (0.8 + 0.4 * random.random()))
+            delay = min(delay * 2, cap)
 
-    while True:
+def _iter_pages(job_id):
+    """
+    Yield each page of Textract results for a job. The request for the next page
+    is already in flight while the caller handles the current one.
+    """
+    def fetch(next_token):
         if next_token:
-            response = textract.get_document_text_detection(JobId=job_id, NextToken=next_token)
-        else:
-            response = textract.get_document_text_detection(JobId=job_id)
+            return _textract().get_document_text_detection(JobId=job_id, NextToken=next_token)
+        return _textract().get_document_text_detection(JobId=job_id)
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        future = prefetcher.submit(fetch, None)
+        while future is not None:
+            response = future.result()
+            next_token = response.get("NextToken")
+            future = prefetcher.submit(fetch, next_token) if next_token else None
+            yield response
+
+def _pdf_hash(pdf_path: Path) -> str:
+    """
+    SHA-256 of the pipeline version and the length-prefixed PDF bytes.
+    """
+    prefix = PIPELINE_VERSION.encode() + pdf_path.stat().st_size.to_bytes(8, "big")
+    return _file_sha256(pdf_path, prefix)
+
+def _repair_one(pdf: Path):
+    """
+    Stage 1a, run in a repair worker process: check the cache, then repair the PDF.
+    Returns (file_record, source, cache_path), where source is what to upload: the
+    optimized PDF bytes, or the original path if it needed no repair. source is None
+    when the PDF was served from the cache or its repair failed.
+    """
+    file_record = {
+        "filename": pdf.name,
+        "status": "pending",
+        "error": None,
+        "repaired": False,
+        "s3_key": None,
+        "output_path": None,
+        "processing_time": None,
+        "cache_hit": False,
+        "n_pages": None
+    }
+    
+    start_time = time.perf_counter()
+    source = None
+    cache_path = None
+    
+    try:
+        print(f"📄 Processing: {pdf.name}")
+        
+        # Reuse the Textract output from an earlier run of the same PDF
+        cache_path = CACHE_DIR / f"{_pdf_hash(pdf)}.json"
+        if cache_path.exists():
+            output_path = OUTPUT_DIR / f"{pdf.stem}.json"
+            shutil.copyfile(cache_path, output_path)
+            file_record["output_path"] = str(output_path)
+            file_record["status"] = "success"
+            file_record["cache_hit"] = True
+            print(f"♻️ Cache hit for {pdf.name}, copied output to {output_path}")
+            return file_record, None, cache_path
+        
+        # Repair and optimize PDF
+        try:
+            info = _pdf_info(pdf)
+            file_record["n_pages"] = info.get("Pages")
+            optimized_pdf = repair_and_optimize_pdf(pdf, info)
+            if optimized_pdf is None:
+                source = pdf
+                file_record["s3_key"] = f"uploads/{pdf.name}"
+            else:
+                source = optimized_pdf
+                file_record["repaired"] = True
+                file_record["s3_key"] = f"uploads/{pdf.stem}_ocr_fixed.pdf"
+        except Exception as e:
+            file_record["status"] = "repair_failed"
+            file_record["error"] = str(e)
+            print(f"❌ Repair failed for {pdf.name}: {str(e)}")
+            
+    except Exception as e:
+        # Catch any unexpected errors
+        file_record["status"] = "unexpected_error"
+        file_record["error"] = str(e)
+        print(f"❌ Unexpected error for {pdf.name}: {str(e)}")
+        
+    finally:
+        file_record["processing_time"] = round(time.perf_counter() - start_time, 2)
+    
+    return file_record, source, cache_path
 
-        pages.append(response)
-        next_token = response.get("NextToken")
-        if not next_token:
-            break
+def _repair_rejected(file_record: dict, cache_path: Path):
+    """
+    Stage 1a for a PDF that was uploaded as-is but failed in Textract: force the
+    repair so it can be resubmitted once. Returns (file_record, source, cache_path)
+    like _repair_one; source is None if the repair failed.
+    """
+    start_time = time.perf_counter()
+    pdf = INPUT_DIR / file_record["filename"]
+    source = None
+    
+    try:
+        source = repair_and_optimize_pdf(pdf, force=True)
+        file_record["repaired"] = True
+        file_record["s3_key"] = f"uploads/{pdf.stem}_ocr_fixed.pdf"
+        file_record["error"] = None
+    except Exception as e:
+        file_record["status"] = "repair_failed"
+        file_record["error"] = str(e)
+        print(f"❌ Repair failed for {pdf.name}: {str(e)}")
+        
+    finally:
+        file_record["processing_time"] = round(file_record["processing_time"] + time.perf_counter() - start_time, 2)
+    
+    return file_record, source, cache_path
 
-    return pages
+def _submit_one(file_record: dict, source):
+    """
+    Stage 1b, run on a thread: upload a PDF (path or bytes) to S3 and start its Textract job.
+    Returns (file_record, job_id); job_id is None if the upload or submission failed.
+    """
+    start_time = time.perf_counter()
+    job_id = None
+    
+    try:
+        s3_key = file_record["s3_key"]
+        upload_to_s3(source, s3_key)
+        
+        job_id = start_textract_job(s3_key)
+        file_record["status"] = "submitted"
+        print(f"📤 Textract job started for {file_record['filename']} [JobId: {job_id}]")
+    except Exception as e:
+        file_record["status"] = "textract_failed"
+        file_record["error"] = str(e)
+        print(f"❌ Textract failed for {file_record['filename']}: {str(e)}")
+        
+    finally:
+        # Finished jobs add their fetch time in _save_results
+        file_record["processing_time"] = round(file_record["processing_time"] + time.perf_counter() - start_time, 2)
+    
+    return file_record, job_id
 
+def _cache_output(output_path: Path, cache_path: Path):
+    """
+    Copy a results file into the cache atomically. Two PDFs with the same content
+    share a cache path, so the copy goes to a temp file that replaces cache_path
+    in one step, and readers never see a half-written entry.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _save_results(job_id, file_record: dict, cache_path: Path, cache: bool = True) -> dict:
+    """
+    Stage 3: fetch the results of a finished Textract job into OUTPUT_DIR, and
+    into the cache too when `cache` is set. Returns the completed file record.
+    """
+    start_time = time.perf_counter()
+    stem = Path(file_record["filename"]).stem
+    
+    try:
+        # Stream result pages into the output file as they arrive, so only one page
+        # is held in memory at a time; the 1MB buffer batches them into few write calls
+        output_path = OUTPUT_DIR / f"{stem}.json"
+        with open(output_path, "wb", buffering=1 << 20) as f:
+            f.write(b"[")
+            for i, page in enumerate(_iter_pages(job_id)):
+                if i:
+                    f.write(b",")
+                f.write(orjson.dumps(page))
+            f.write(b"]\n")
+        if cache:
+            _cache_output(output_path, cache_path)
+        
+        file_record["output_path"] = str(output_path)
+        file_record["status"] = "success"
+        print(f"💾 Saved Textract output to {output_path}")
+        
+    except Exception as e:
+        file_record["status"] = "textract_failed"
+        file_record["error"] = str(e)
+        print(f"❌ Textract failed for {file_record['filename']}: {str(e)}")
+        
+    finally:
+        file_record["processing_time"] = round(file_record["processing_time"] + time.perf_counter() - start_time, 2)
+    
+    return file_record
 
 def main():
     """
     Main pipeline function that processes all PDFs through repair, upload, and OCR.
+    Runs in three stages so Textract works on every document at once: repair, upload
+    and start a job for every PDF; poll all open jobs together; fetch results as
+    each job finishes. An original that Textract fails on is repaired and goes
+    round once more. Repairs run on a process pool; uploads, submissions and
+    fetches run on a thread pool.
     Logs all results to ocr_pipeline_log.json for diagnostics.
     """
+    print("Running unified textract_processor.py with integrated OCR repair...")
+    
+    # Create necessary directories
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    CACHE_DIR.mkdir(exist_ok=True)
+    
+    pipeline_t0 = time.monotonic()
     print(f"\n🚀 Starting unified OCR pipeline at {datetime.now().isoformat()}")
     print(f"📁 Processing PDFs from: {INPUT_DIR}")
     
@@ -148,6 +465,7 @@ def main():
         "successful": 0,
         "repair_failures": 0,
         "textract_failures": 0,
+        "cache_hits": 0,
         "files": []
     }
     
@@ -161,96 +479,97 @@ def main():
     
     print(f"📊 Found {len(pdf_files)} PDF files to process\n")
     
-    for pdf in pdf_files:
-        file_record = {
-            "filename": pdf.name,
-            "status": "pending",
-            "error": None,
-            "optimized_path": None,
-            "output_path": None,
-            "processing_time": None
-        }
-        
-        start_time = time.time()
-        
-        try:
-            print(f"\n{'='*60}")
-            print(f"📄 Processing: {pdf.name}")
-            print(f"{'='*60}")
-            
-            # Step 1: Repair and optimize PDF
-            try:
-                optimized_pdf = repair_and_optimize_pdf(pdf, TEMP_IMAGE_DIR, OPTIMIZED_PDF_DIR)
-                file_record["optimized_path"] = str(optimized_pdf)
-            except Exception as e:
-                file_record["status"] = "repair_failed"
-                file_record["error"] = str(e)
-                processing_summary["repair_failures"] += 1
-                print(f"❌ Repair failed for {pdf.name}: {str(e)}")
-                processing_summary["files"].append(file_record)
-                continue
-            
-            # Step 2: Process with Textract
-            try:
-                # Upload to S3
-                s3_key = f"uploads/{optimized_pdf.name}"
-                upload_to_s3(optimized_pdf, s3_key)
-                
-                # Start Textract job
-                job_id = start_textract_job(s3_key)
-                print(f"📤 Textract job started [JobId: {job_id}]")
-                
-                # Wait for completion
-                while True:
-                    status, _ = is_job_complete(job_id)
-                    if status == "SUCCEEDED":
-                        print(f"✅ Textract succeeded for {pdf.name}")
-                        break
-                    elif status == "FAILED":
-                        raise Exception("Textract job failed")
+    # boto3 clients are thread-safe but sessions aren't, so build both clients
+    # here before the workers start sharing them
+    _s3()
+    _textract()
+    
+    with ProcessPoolExecutor(max_workers=REPAIR_WORKERS, initializer=_init_repair_worker) as repair_pool, \
+         ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        def repair_and_submit(repair_fn, pending):
+            """
+            Run repair_fn on each argument tuple in `pending` on the repair pool,
+            handing each PDF to a thread to upload and submit as soon as its repair
+            finishes. New repairs start only while fewer than MAX_PDFS_IN_FLIGHT
+            PDFs are repairing or uploading, so repaired bytes can't pile up when
+            rasterizing outpaces the uploads. Returns the started jobs as
+            {job_id: (file_record, cache_path)}.
+            """
+            pending = deque(pending)
+            repairs = set()
+            submissions = {}
+            while pending or repairs:
+                uploading = {f for f in submissions if not f.done()}
+                while pending and len(repairs) + len(uploading) < MAX_PDFS_IN_FLIGHT:
+                    repairs.add(repair_pool.submit(repair_fn, *pending.popleft()))
+
+                done, _ = wait(repairs | uploading, return_when=FIRST_COMPLETED)
+                for future in done & repairs:
+                    repairs.remove(future)
+                    file_record, source, cache_path = future.result()
+                    if source is None:
+                        processing_summary["files"].append(file_record)
                     else:
-                        print("⏳ Waiting for Textract to complete...")
-                        time.sleep(5)
-                
-                # Get results
-                result = get_job_results(job_id)
-                
-                # Save results
-                output_path = OUTPUT_DIR / f"{pdf.stem}.json"
-                with open(output_path, "w") as f:
-                    json.dump(result, f)
-                    
-                file_record["output_path"] = str(output_path)
-                file_record["status"] = "success"
-                processing_summary["successful"] += 1
-                print(f"💾 Saved Textract output to {output_path}")
-                
-            except Exception as e:
-                file_record["status"] = "textract_failed"
-                file_record["error"] = str(e)
-                processing_summary["textract_failures"] += 1
-                print(f"❌ Textract failed for {pdf.name}: {str(e)}")
-                
-        except Exception as e:
-            # Catch any unexpected errors
-            file_record["status"] = "unexpected_error"
-            file_record["error"] = str(e)
-            print(f"❌ Unexpected error for {pdf.name}: {str(e)}")
+                        submissions[executor.submit(_submit_one, file_record, source)] = cache_path
             
-        finally:
-            # Record processing time
-            file_record["processing_time"] = round(time.time() - start_time, 2)
-            processing_summary["files"].append(file_record)
+            jobs = {}
+            for future in as_completed(submissions):
+                file_record, job_id = future.result()
+                if job_id is None:
+                    processing_summary["files"].append(file_record)
+                else:
+                    jobs[job_id] = (file_record, submissions[future])
+            return jobs
+        
+        # Stage 1: repair, upload and start a job for every PDF
+        jobs = repair_and_submit(_repair_one, [(pdf,) for pdf in pdf_files])
+        
+        # Stage 2: poll all open jobs, handing each one to stage 3 as soon as it finishes.
+        # Textract can reject a PDF that passed the well-formedness check, so a failed
+        # job on an unrepaired original is repaired and resubmitted once, in another round.
+        fetches = []
+        while jobs:
+            print(f"\n⏳ Waiting for {len(jobs)} Textract job(s) to complete...")
+            rejected = []
+            for job_id, status, error in _wait_for_jobs(jobs):
+                file_record, cache_path = jobs[job_id]
+                if status not in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+                    error = error or f"Textract job {status.lower()}"
+                    if not file_record["repaired"]:
+                        print(f"🔁 Textract failed for {file_record['filename']} ({error}), repairing and resubmitting")
+                        rejected.append((file_record, cache_path))
+                        continue
+                    file_record["status"] = "textract_failed"
+                    file_record["error"] = error
+                    print(f"❌ Textract failed for {file_record['filename']}: {file_record['error']}")
+                    processing_summary["files"].append(file_record)
+                else:
+                    # Partial results are saved but not cached, so the next run retries the PDF
+                    print(f"✅ Textract {'succeeded' if status == 'SUCCEEDED' else 'partially succeeded'} for {file_record['filename']}")
+                    fetches.append(executor.submit(_save_results, job_id, file_record, cache_path, status == "SUCCEEDED"))
+            jobs = repair_and_submit(_repair_rejected, rejected)
+        
+        # Stage 3: collect fetched results
+        for future in as_completed(fetches):
+            processing_summary["files"].append(future.result())
+    
+    # Tally outcomes once all workers are done
+    for file_record in processing_summary["files"]:
+        if file_record["status"] == "success":
+            processing_summary["successful"] += 1
+            if file_record["cache_hit"]:
+                processing_summary["cache_hits"] += 1
+        elif file_record["status"] == "repair_failed":
+            processing_summary["repair_failures"] += 1
+        elif file_record["status"] == "textract_failed":
+            processing_summary["textract_failures"] += 1
     
     # Final summary
     processing_summary["pipeline_end"] = datetime.now().isoformat()
-    processing_summary["total_processing_time"] = round(
-        (datetime.now() - datetime.fromisoformat(processing_summary["pipeline_start"])).total_seconds(), 2
-    )
+    processing_summary["total_processing_time"] = round(time.monotonic() - pipeline_t0, 2)
     
     # Write processing log
-    with open(LOG_FILE, "w") as f:
-        json.dump(processing_summary, f, indent=2)
+    LOG_FILE.write_bytes(orjson.dumps(processing_summary, option=orjson.OPT_INDENT_2))
     
     # Print summary
     print(f"\n{'='*60}")
@@ -258,6 +577,7 @@ def main():
     print(f"{'='*60}")
     print(f"Total files: {processing_summary['total_files']}")
     print(f"✅ Successful: {processing_summary['successful']}")
+    print(f"♻️ From cache: {processing_summary['cache_hits']}")
     print(f"❌ Repair failures: {processing_summary['repair_failures']}")
     print(f"❌ Textract failures: {processing_summary['textract_failures']}")
     print(f"⏱️  Total time: {processing_summary['total_processing_time']}s")